@@ -3,6 +3,7 @@ from flask import Flask, render_template, request, jsonify, send_from_directory
 import logging
 from retrieval_system import HybridVideoRetrievalSystem 
 import config
+from utils.ranker import GROUP_AGGREGATIONS
 
 log_file = "system.log"
 logging.basicConfig(
@@ -15,13 +16,20 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
+search_system = None
 
-try:
-    search_system = HybridVideoRetrievalSystem(re_ingest=False)
-    logger.info("✅ Search system loaded successfully!")
-except Exception as e:
-    logger.error(f"💥 Failed to load search system: {e}")
-    search_system = None
+def load_search_system():
+    """
+    Builds the search system. Not done at import time: local keyframe shards are spawned
+    processes, and spawned processes re-import the main module.
+    """
+    global search_system
+    try:
+        search_system = HybridVideoRetrievalSystem(re_ingest=False)
+        logger.info("✅ Search system loaded successfully!")
+    except Exception as e:
+        logger.error(f"💥 Failed to load search system: {e}")
+        search_system = None
 
 @app.route('/')
 def home():
@@ -42,13 +50,50 @@ def search_api():
 
     logger.info(f"Received search request: {query_data}")
 
+    aggregation = query_data.get("aggregation", config.GROUP_AGGREGATION)
+    if aggregation not in GROUP_AGGREGATIONS:
+        return jsonify({"error": f"Invalid aggregation. Expected one of: {', '.join(GROUP_AGGREGATIONS)}."}), 400
+
+    top_k = config.VIDEO_TOP_K if query_data.get("group_by_video") else 100
     try:
-        results = search_system.search(query_data=query_data, top_k=100)
+        results = search_system.search(query_data=query_data, top_k=top_k)
         return jsonify(results)
     except Exception as e:
         logger.error(f"An error occurred during search: {e}", exc_info=True)
         return jsonify({"error": "An internal error occurred during search."}), 500
 
+@app.route('/health')
+def health_api():
+    """
+    Reports circuit breaker state, error counts and latency percentiles per backend.
+    """
+    if not search_system:
+        return jsonify({"status": "unavailable"}), 503
+
+    stats = search_system.backend_stats()
+    status = "ok" if all(s["healthy"] for s in stats.values()) else "degraded"
+    return jsonify({"status": status, "backends": stats})
+
+@app.route('/similar/<path:video_id>/<int:keyframe_index>')
+def similar_api(video_id, keyframe_index):
+    """
+    Returns the keyframes most similar to the given one, from the precomputed kNN graph.
+    """
+    if not search_system or not search_system.knn_graph:
+        return jsonify({"error": "Similar-frame search is not available."}), 503
+
+    top_k = request.args.get('top_k', default=100, type=int)
+    top_k = max(1, min(top_k, config.KNN_NEIGHBORS))
+    try:
+        results = search_system.similar(video_id, keyframe_index, top_k=top_k)
+    except Exception as e:
+        logger.error(f"An error occurred during similar-frame search: {e}", exc_info=True)
+        return jsonify({"error": "An internal error occurred during similar-frame search."}), 500
+
+    if results is None:
+        return jsonify({"error": f"Unknown keyframe: {video_id}/{keyframe_index}"}), 404
+    return jsonify(results)
+
 @app.route('/frames/<path:video_id>/<int:keyframe_index>')
 def serve_frame_image(video_id, keyframe_index):
     """
@@ -84,4 +129,8 @@ def serve_video_file(video_id):
         return "Video not found", 404
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    debug = True
+    # The debug reloader re-runs this file in a child process that does the serving; only load there.
+    if not debug or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        load_search_system()
+    app.run(host='0.0.0.0', port=5000, debug=debug)
\ No newline at end of file
@@ -0,0 +1,79 @@
+"""
+Measures keyframe search throughput of the sharded index for several shard counts, with
+several concurrent clients so that queries overlap across shards. Uses stored keyframe
+vectors as queries: the compacted data (compact_data.py), or random vectors with --synthetic.
+
+Throughput can only scale with shard count when there are at least as many free cores as shards.
+
+Usage:
+    python benchmark_shards.py --shards 1 2 4 --clients 8 --queries 400 --top-k 500
+    python benchmark_shards.py --synthetic 200000
+"""
+import argparse
+import logging
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+import config
+from utils import columnar_store
+from utils.columnar_store import KeyframeStore
+from retrievers.sharded_retriever import ShardedKeyframeIndex
+
+logging.basicConfig(level=logging.WARNING, format="%(asctime)s [%(levelname)s] - %(message)s")
+logger = logging.getLogger(__name__)
+
+def write_synthetic_store(num_vectors: int, data_dir: str, frames_per_video: int = 200):
+    """Writes random unit vectors as a compacted store, split into videos of `frames_per_video`."""
+    rng = np.random.default_rng(0)
+    video_vectors = []
+    for start in range(0, num_vectors, frames_per_video):
+        vectors = rng.standard_normal((min(frames_per_video, num_vectors - start), config.VECTOR_DIMENSION), dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        path = os.path.join(data_dir, f"V{start // frames_per_video:06d}.npy")
+        np.save(path, vectors)
+        video_vectors.append((f"V{start // frames_per_video:06d}", path))
+    columnar_store.write_keyframe_vectors(video_vectors, data_dir)
+
+def run(index: ShardedKeyframeIndex, queries, clients: int, top_k: int) -> float:
+    """Returns queries per second with `clients` concurrent callers."""
+    with ThreadPoolExecutor(clients) as executor:
+        list(executor.map(lambda q: index.search_keyframes(q, limit=top_k, min_keep=top_k), queries[:clients])) # Warm-up
+        start = time.perf_counter()
+        list(executor.map(lambda q: index.search_keyframes(q, limit=top_k, min_keep=top_k), queries))
+        return len(queries) / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sharded keyframe search.")
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=8, help="Concurrent callers")
+    parser.add_argument("--queries", type=int, default=400)
+    parser.add_argument("--top-k", type=int, default=500)
+    parser.add_argument("--synthetic", type=int, default=0, help="Benchmark on this many random vectors instead")
+    args = parser.parse_args()
+
+    data_dir = config.COMPACT_DATA_DIR
+    if args.synthetic:
+        data_dir = tempfile.mkdtemp()
+        write_synthetic_store(args.synthetic, data_dir)
+
+    store = KeyframeStore(data_dir)
+    rng = np.random.default_rng(0)
+    queries = np.asarray(store.vectors[np.sort(rng.choice(len(store), size=min(args.queries, len(store)), replace=False))])
+
+    print(f"{len(store)} keyframes, {args.clients} clients, top_k={args.top_k}, {os.cpu_count()} CPUs")
+    print(f"{'shards':>6} {'QPS':>10} {'speedup':>8}")
+    base_qps = None
+    for num_shards in args.shards:
+        index = ShardedKeyframeIndex(num_shards=num_shards, data_dir=data_dir)
+        try:
+            qps = run(index, queries, args.clients, args.top_k)
+        finally:
+            index.close()
+        base_qps = base_qps or qps
+        print(f"{num_shards:>6} {qps:>10.1f} {qps / base_qps:>7.2f}x")
+
+if __name__ == "__main__":
+    main()
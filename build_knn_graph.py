@@ -0,0 +1,28 @@
+"""
+Offline build of the keyframe kNN graph used by the /similar endpoint.
+Requires the compacted data (compact_data.py) and an ingested Milvus collection.
+
+Usage:
+    python build_knn_graph.py
+"""
+import logging
+from pymilvus import connections, Collection
+
+import config
+from utils.columnar_store import KeyframeStore
+from utils.knn_graph import build_knn_graph
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] - %(message)s")
+logger = logging.getLogger(__name__)
+
+def main():
+    connections.connect("default", host=config.MILVUS_HOST, port=config.MILVUS_PORT)
+    collection = Collection(config.KEYFRAME_COLLECTION_NAME)
+    collection.load()
+
+    store = KeyframeStore()
+    build_knn_graph(collection, store)
+    logger.info("--- kNN GRAPH BUILD COMPLETE ---")
+
+if __name__ == "__main__":
+    main()
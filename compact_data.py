@@ -0,0 +1,74 @@
+"""
+One-time compaction of the raw ingestion data into a few large files in config.COMPACT_DATA_DIR:
+
+    keyframe_vectors.npy  - all CLIP keyframe vectors, contiguous float32
+    keyframes.parquet     - (video_id, keyframe_index) for each vector row
+    ocr.parquet           - (video_id, keyframe_index, ocr_text)
+    objects.parquet       - (video_id, keyframe_index, label, count), filtered by detection score
+    manifest.json         - fingerprint of the raw sources and OD_SCORE_THRESHOLD
+
+Once built, ingest_data.py reads these instead of the per-video / per-keyframe files,
+as long as the raw sources and threshold still match the manifest. Raw source directories
+that are removed after compaction are not checked.
+
+Usage:
+    python compact_data.py
+"""
+import logging
+import os
+from pathlib import Path
+
+import config
+from ingest_data import load_json, load_od_data
+from utils import columnar_store
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] - %(message)s")
+logger = logging.getLogger(__name__)
+
+def ocr_rows(video_ids):
+    for video_id in video_ids:
+        ocr_data = load_json(Path(config.OCR_DIR) / f"{video_id}.json")
+        frame_indices = [int(frame_idx) for frame_idx in ocr_data]
+        yield {
+            "video_id": [video_id] * len(ocr_data),
+            "keyframe_index": frame_indices,
+            "ocr_text": list(ocr_data.values())
+        }
+
+def object_rows(video_ids, threshold: float):
+    for video_id in video_ids:
+        obj_data = load_od_data(Path(config.OBJECT_DETECTION_DIR) / video_id, threshold=threshold)
+        columns = {"video_id": [], "keyframe_index": [], "label": [], "count": []}
+        for frame_idx, object_counts in obj_data.items():
+            for label, count in object_counts.items():
+                columns["video_id"].append(video_id)
+                columns["keyframe_index"].append(int(frame_idx))
+                columns["label"].append(label)
+                columns["count"].append(count)
+        yield columns
+
+def main(data_dir: str = config.COMPACT_DATA_DIR):
+    os.makedirs(data_dir, exist_ok=True)
+    # Taken before reading, so changes made while compacting show up as stale.
+    fingerprint = columnar_store.source_fingerprint()
+
+    logger.info("Packing keyframe vectors...")
+    video_vectors = sorted((p.stem, p) for p in Path(config.CLIP_FEATURES_DIR).glob("*.npy"))
+    columnar_store.write_keyframe_vectors(video_vectors, data_dir)
+
+    video_ids = sorted(p.stem for p in Path(config.METADATA_DIR).glob("*.json"))
+
+    logger.info("Packing OCR results...")
+    columnar_store.write_table_rows(ocr_rows(video_ids), os.path.join(data_dir, columnar_store.OCR_FILE),
+                                    columnar_store.OCR_SCHEMA)
+
+    logger.info("Packing object detections...")
+    columnar_store.write_table_rows(object_rows(video_ids, config.OD_SCORE_THRESHOLD),
+                                    os.path.join(data_dir, columnar_store.OBJECTS_FILE),
+                                    columnar_store.OBJECTS_SCHEMA)
+
+    columnar_store.write_manifest(fingerprint, data_dir)
+    logger.info(f"--- COMPACTION COMPLETE: {data_dir} ---")
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,31 @@
+import os
+
 # --- Milvus/Elasticsearch connection settings ---
 MILVUS_HOST = "localhost"
 MILVUS_PORT = "19530"
 ES_HOST = "localhost"
 ES_PORT = "9200"
+ES_POOL_SIZE = 10 # Pooled keep-alive HTTP connections per ES node
+ES_MAX_RETRIES = 1
+
+# --- Backend resilience ---
+SEARCH_BUDGET_S = 5.0 # Total time budget shared by the backend calls of one search
+MIN_BACKEND_TIMEOUT_S = 0.05 # Skip a backend call if less budget than this is left
+BREAKER_FAILURE_THRESHOLD = 3 # Consecutive failures before a backend is skipped
+BREAKER_RESET_TIMEOUT_S = 30 # Time before a skipped backend is tried again
 
 # --- Milvus collection settings ---
 KEYFRAME_COLLECTION_NAME = "video_keyframes"
 VECTOR_DIMENSION = 512 
 
+# --- Sharded keyframe search (instead of Milvus) ---
+KEYFRAME_SHARDS = 0 # Number of local shard worker processes, 0 = search Milvus
+KEYFRAME_SHARD_ADDRESSES = [] # Remote shard servers ("host:port", see shard_worker.py); overrides KEYFRAME_SHARDS
+# Shared secret for remote shards. Shard traffic is pickled, so anyone holding the key can run
+# code on a shard host: set it via the environment, never in this file.
+SHARD_AUTHKEY = os.environ.get("AIC_SHARD_AUTHKEY")
+SHARD_BIND_HOST = "127.0.0.1" # Interface shard_worker.py listens on
+
 # --- Elasticsearch index names ---
 METADATA_INDEX_NAME = "video_metadata"
 ES_FRAMES_INDEX_NAME = "video_frames"
@@ -19,12 +37,36 @@ OCR_DIR = "data/ocr_results"
 OBJECT_DETECTION_DIR = "data/objects"
 KEYFRAMES_DIR = "data/key_frames"
 VIDEOS_DIR = "data/videos"
+COMPACT_DATA_DIR = "data/compact" # Output of compact_data.py, used instead of the files above when present
+OD_SCORE_THRESHOLD = 0.5 # Minimum detection score for an object to be indexed
 
 # --- Model ---
 MODEL_NAME = "M-CLIP/XLM-Roberta-Large-Vit-B-32"
+# Precision of the text encoder on CPU: "fp32" or "int8" (dynamic quantization).
+# CUDA devices always run the fp32 model.
+ENCODER_PRECISION = "int8"
+QUANTIZED_MODEL_DIR = "models/mclip-int8" # Local cache for the quantized copy
+ENCODER_NUM_THREADS = 0 # Intra-op threads on CPU, 0 = torch default
+ENCODER_INTEROP_THREADS = 0 # Inter-op threads on CPU, 0 = torch default
+ENCODER_MIN_COSINE = 0.99 # Minimum cosine similarity of int8 vs fp32 embeddings
 
 # --- Search Parameters ---
 RRF_K = 60 # Fusion parameter
+CANDIDATE_MULTIPLIER = 5 # Candidates fetched per retriever = top_k * multiplier, capped below
+MIN_CANDIDATE_DEPTH = 50
+MILVUS_MAX_CANDIDATES = 500
+ES_FRAMES_MAX_CANDIDATES = 1000
+ES_METADATA_MAX_CANDIDATES = 500
+# Early cut-off: stop taking candidates once they score below this fraction of the best one
+ES_SCORE_CUTOFF = 0.2
+VECTOR_DISTANCE_CUTOFF = 0.8 # Same for L2 distances: stop above best distance / cutoff
+
+# --- Video-level grouped search ---
+VIDEO_TOP_K = 20 # Videos returned in grouped mode
+GROUPED_FRAMES_PER_VIDEO = 3 # Candidate frames fetched and best frames returned per video
+GROUP_AGGREGATION = "max" # How frame scores become a video score: "max", "sum" or "topn_mean"
+KNN_NEIGHBORS = 100 # Neighbours stored per keyframe in the similar-frames graph
+KNN_NPROBE = 32 # IVF clusters probed while building the graph
 
 OBJECT_LABELS = [
     "Tortoise", "Container", "Magpie", "Sea turtle", "Football", "Ambulance", 
@@ -7,6 +7,7 @@ from elasticsearch.helpers import bulk
 from pymilvus import connections, utility, FieldSchema, CollectionSchema, DataType, Collection
 from collections import Counter
 import config
+from utils import columnar_store
 
 logger = logging.getLogger(__name__)
 
@@ -24,8 +25,17 @@ def setup_milvus_collection(collection_name, schema, index_field, index_params):
     logger.info("Index created and data flushed.")
     return collection
 
-def ingest_keyframe_data(collection: Collection):
+def ingest_keyframe_data(collection: Collection, use_compacted: bool = False):
     logger.info("Ingesting keyframe data into Milvus...")
+    if use_compacted:
+        store = columnar_store.KeyframeStore()
+        for video_id, keyframe_indices, vectors in store.iter_videos():
+            entities = [[video_id] * len(vectors), keyframe_indices.tolist(), np.ascontiguousarray(vectors)]
+            collection.insert(entities)
+        collection.flush()
+        logger.info("Keyframe data ingestion complete.")
+        return
+
     for npy_file in Path(config.CLIP_FEATURES_DIR).glob("*.npy"):
         video_id = npy_file.stem
         vectors = np.load(npy_file).astype(np.float32)
@@ -120,22 +130,35 @@ def load_od_data(video_dir: Path, threshold: float = 0.5) -> dict:
             
     return all_frames_data
 
-def generate_frames_actions():
-    all_video_ids = {p.stem for p in Path(config.METADATA_DIR).glob("*.json")}
+def iter_frames_data(use_compacted: bool = False):
+    """
+    Yields (video_id, ocr_data, obj_data) per video, both keyed by int keyframe index.
+    Reads the compacted Parquet files if `use_compacted`, else the per-video / per-keyframe JSON files.
+    """
+    if use_compacted:
+        # Streamed one video at a time. Compaction already kept only the videos with metadata,
+        # and videos without OCR or objects have no frames to index anyway.
+        yield from columnar_store.iter_frames_by_video()
+        return
 
+    all_video_ids = {p.stem for p in Path(config.METADATA_DIR).glob("*.json")}
     for video_id in all_video_ids:
         ocr_data = load_json(Path(config.OCR_DIR) / f"{video_id}.json")
 
         obj_dir = Path(config.OBJECT_DETECTION_DIR) / video_id
-        obj_data = load_od_data(obj_dir, threshold=0.5)
-        
+        obj_data = load_od_data(obj_dir, threshold=config.OD_SCORE_THRESHOLD)
+
+        yield (video_id,
+               {int(k): v for k, v in ocr_data.items()},
+               {int(k): v for k, v in obj_data.items()})
+
+def generate_frames_actions(use_compacted: bool = False):
+    for video_id, ocr_data, obj_data in iter_frames_data(use_compacted):
         all_frame_indices = set(ocr_data.keys()) | set(obj_data.keys())
 
-        for frame_idx_str in all_frame_indices:
-            frame_idx = int(frame_idx_str)
-            
+        for frame_idx in all_frame_indices:
             # Get the dictionary of object counts for the frame. Default to an empty dict.
-            object_counts = obj_data.get(frame_idx_str, {})
+            object_counts = obj_data.get(frame_idx, {})
 
             # Directly create the nested structure for Elasticsearch from the counts.
             nested_objects = [{"label": label, "count": count} for label, count in object_counts.items()]
@@ -143,7 +166,7 @@ def generate_frames_actions():
             doc = {
                 "video_id": video_id,
                 "keyframe_index": frame_idx,
-                "ocr_text": ocr_data.get(frame_idx_str, ""),
+                "ocr_text": ocr_data.get(frame_idx, ""),
                 "detected_objects": nested_objects
             }
             yield {"_index": config.ES_FRAMES_INDEX_NAME, "_id": f"{video_id}_{frame_idx}", "_source": doc}
@@ -159,6 +182,9 @@ def main():
     if not es.ping():
         raise ConnectionError("Initial ping to Elasticsearch failed.")
 
+    # Checked once, so Milvus and ES are filled from the same source.
+    use_compacted = columnar_store.is_fresh()
+
     # --- Milvus Ingestion ---
     kf_fields = [
         FieldSchema(name="pk", dtype=DataType.INT64, is_primary=True, auto_id=True),
@@ -170,7 +196,7 @@ def main():
     kf_index_params = {"metric_type": "L2", "index_type": "IVF_FLAT", "params": {"nlist": 128}}
     
     kf_collection = setup_milvus_collection(config.KEYFRAME_COLLECTION_NAME, kf_schema, "keyframe_vector", kf_index_params)
-    ingest_keyframe_data(kf_collection)
+    ingest_keyframe_data(kf_collection, use_compacted)
 
     # --- Elasticsearch Ingestion ---
     setup_es_index(es, config.METADATA_INDEX_NAME, actions_generator=generate_metadata_actions)
@@ -189,6 +215,6 @@ def main():
                     }
                 }
             }
-    setup_es_index(es, config.ES_FRAMES_INDEX_NAME, mappings=frames_mappings, actions_generator=generate_frames_actions)
+    setup_es_index(es, config.ES_FRAMES_INDEX_NAME, mappings=frames_mappings, actions_generator=lambda: generate_frames_actions(use_compacted))
 
     logger.info("--- DATA INGESTION COMPLETE ---")
\ No newline at end of file
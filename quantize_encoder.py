@@ -0,0 +1,74 @@
+"""
+Builds the int8 copy of the text encoder in config.QUANTIZED_MODEL_DIR. The copy is only saved
+if its embeddings stay within config.ENCODER_MIN_COSINE of fp32. Then compares encoder
+cold start and encode latency of the two.
+
+Usage:
+    python quantize_encoder.py
+"""
+import logging
+import sys
+import time
+import numpy as np
+
+import config
+from utils.text_encoder import TextEncoder, build_quantized_model
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] - %(message)s")
+logger = logging.getLogger(__name__)
+
+SAMPLE_QUERIES = [
+    "a man riding a motorbike on a busy street",
+    "người phụ nữ đang nấu ăn trong bếp",
+    "bản tin thời sự buổi tối",
+    "two children playing football in a park",
+    "xe cứu thương chạy trên đường cao tốc",
+    "a red car parked in front of a building",
+    "lễ hội pháo hoa đêm giao thừa",
+    "a news anchor sitting at a desk",
+]
+
+def benchmark(precision: str, queries: list):
+    start = time.perf_counter()
+    encoder = TextEncoder(device="cpu", precision=precision)
+    load_time = time.perf_counter() - start
+
+    # The first query also pages in any weights that loading only memory-mapped.
+    start = time.perf_counter()
+    encoder.encode(queries[0])
+    first_time = time.perf_counter() - start
+
+    embeddings = []
+    start = time.perf_counter()
+    for query in queries:
+        embeddings.append(encoder.encode(query)[0])
+    encode_time = (time.perf_counter() - start) / len(queries)
+    return np.stack(embeddings), load_time, first_time, encode_time
+
+def main():
+    try:
+        build_quantized_model(SAMPLE_QUERIES)
+    except RuntimeError as e:
+        logger.error(f"💥 {e}. The quantized model was not saved.")
+        sys.exit(1)
+
+    fp32_embs, fp32_load, fp32_first, fp32_encode = benchmark("fp32", SAMPLE_QUERIES)
+    int8_embs, int8_load, int8_first, int8_encode = benchmark("int8", SAMPLE_QUERIES)
+
+    # Re-check the drift on the reloaded copy, which is what the app will serve.
+    fp32_norm = fp32_embs / np.linalg.norm(fp32_embs, axis=1, keepdims=True)
+    int8_norm = int8_embs / np.linalg.norm(int8_embs, axis=1, keepdims=True)
+    cosine = np.sum(fp32_norm * int8_norm, axis=1)
+
+    logger.info(f"Encoder cold start (load + first query): fp32 {fp32_load:.2f}s + {fp32_first:.2f}s, "
+                f"int8 {int8_load:.2f}s + {int8_first:.2f}s")
+    logger.info(f"Encode latency: fp32 {fp32_encode * 1000:.1f}ms, int8 {int8_encode * 1000:.1f}ms")
+    logger.info(f"Cosine(int8, fp32): min {cosine.min():.4f}, mean {cosine.mean():.4f}")
+
+    if cosine.min() < config.ENCODER_MIN_COSINE:
+        logger.error(f"Reloaded int8 model drifts beyond tolerance (min cosine < {config.ENCODER_MIN_COSINE}).")
+        sys.exit(1)
+    logger.info("✅ int8 encoder is within tolerance.")
+
+if __name__ == "__main__":
+    main()
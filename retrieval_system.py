@@ -1,14 +1,15 @@
 import logging
-from pymilvus import connections, Collection
-from elasticsearch import Elasticsearch
-import torch
 from PIL import Image, UnidentifiedImageError
 import os
 
 import config
 from utils.text_encoder import TextEncoder
-from utils.ranker import rrf_ranker, CrossModalReRanker
-from retrievers import milvus_retriever, es_retriever
+from utils.ranker import rrf_ranker, group_by_video, CrossModalReRanker
+from utils import columnar_store
+from utils.knn_graph import KnnGraph
+from retrievers import milvus_retriever, es_retriever, backends
+from retrievers.sharded_retriever import ShardedKeyframeIndex
+from retrievers.candidate_depth import candidate_depth
 
 # --- Setup Logging ---
 # log_file = "system.log"
@@ -29,11 +30,15 @@ class HybridVideoRetrievalSystem:
 
         logger.info("Initializing Hybrid Video Retrieval System...")
 
+        # Heavy modules are imported here so that importing this module stays cheap.
+        import torch
+        from pymilvus import Collection
+
         # Initialize connections
-        connections.connect("default", host=config.MILVUS_HOST, port=config.MILVUS_PORT)
+        backends.connect_milvus()
         logger.info("Successfully connected to Milvus.")
 
-        self.es = Elasticsearch(f"http://{config.ES_HOST}:{config.ES_PORT}", timeout=30, retry_on_timeout=True, max_retries=3)
+        self.es = backends.create_es_client()
         if not self.es.ping():
             raise ConnectionError("Could not connect to Elasticsearch.")
         logger.info("Successfully connected to Elasticsearch.")
@@ -41,12 +46,45 @@ class HybridVideoRetrievalSystem:
         # Load Milvus collections
         self.keyframes_collection = Collection(config.KEYFRAME_COLLECTION_NAME)
         self.keyframes_collection.load()
+
+        # Optional sharded keyframe index, searched instead of the Milvus collection
+        self.sharded_index = None
+        if config.KEYFRAME_SHARD_ADDRESSES or config.KEYFRAME_SHARDS > 0:
+            # Shards serve the compacted vectors, so they must match what was ingested into Milvus and ES.
+            # Local shards are checked here; remote shard servers check their own copy on startup.
+            try:
+                if not config.KEYFRAME_SHARD_ADDRESSES and not columnar_store.is_fresh():
+                    raise RuntimeError("compacted keyframes are missing or stale, re-run compact_data.py")
+                self.sharded_index = ShardedKeyframeIndex(addresses=config.KEYFRAME_SHARD_ADDRESSES)
+            except Exception as e:
+                logger.error(f"💥 Failed to start sharded keyframe search, searching Milvus instead: {e}")
         
         # Initialize the text encoder and reranker
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
         self.encoder = TextEncoder(device=self.device)
         # self.reranker = CrossModalReRanker(device=self.device)
 
+        # Per-backend circuit breakers and latency stats
+        self.backends = {
+            "milvus_keyframes": backends.Backend("milvus_keyframes"),
+            "es_metadata": backends.Backend("es_metadata"),
+            "es_keyframes": backends.Backend("es_keyframes"),
+        }
+        if self.sharded_index:
+            self.backends["sharded_keyframes"] = backends.Backend("sharded_keyframes")
+
+        # Precomputed keyframe kNN graph for similar-frame lookups
+        self.knn_graph = None
+        if columnar_store.is_available() and KnnGraph.is_available():
+            # Optional feature: a stale or unreadable graph only disables similar-frame search.
+            try:
+                self.knn_graph = KnnGraph(columnar_store.KeyframeStore())
+                logger.info("Keyframe kNN graph loaded.")
+            except Exception as e:
+                logger.error(f"💥 Failed to load keyframe kNN graph, similar-frame search is disabled: {e}")
+        else:
+            logger.warning("No keyframe kNN graph found. Similar-frame search is disabled.")
+
     def _load_keyframe_image(self, video_id: str, keyframe_index: int):
         """
         Loads a single keyframe image from disk as a PIL Image.
@@ -87,6 +125,9 @@ class HybridVideoRetrievalSystem:
         Performs a multi-stage search:
         1. Retrieval: Hybrid search (Milvus + ES) to get candidates.
         2. Re-ranking: Cross-Encoder model to re-order the top candidates.
+
+        If query_data["group_by_video"] is set, returns the top_k videos instead, ranked by
+        their aggregated fused frame scores (query_data["aggregation"]), with their best frames.
         """
         logger.info(f"--- 💠 Starting search with data: {query_data} ---")
         
@@ -94,6 +135,8 @@ class HybridVideoRetrievalSystem:
         object_list = query_data.get("objects")
         text = query_data.get("text", "")
         metadata = query_data.get("metadata", "")
+        grouped = bool(query_data.get("group_by_video", False))
+        aggregation = query_data.get("aggregation", config.GROUP_AGGREGATION)
 
         if not query:
             object_query = ""
@@ -107,10 +150,35 @@ class HybridVideoRetrievalSystem:
             return []
 
         logger.info("1/3: Searching...")
+        deadline = backends.Deadline()
         query_vector = self.encoder.encode(query)
-        vector_scores = milvus_retriever.search_keyframes(self.keyframes_collection, query_vector)
-        meta_scores = es_retriever.search_metadata(self.es, metadata)
-        content_scores = es_retriever.search_keyframes(self.es, text, object_list)
+        # Candidate depth follows top_k; each retriever always keeps at least top_k hits before its score cut-off.
+        # In grouped mode top_k counts videos, and retrievers keep only a few frames per video
+        # (ES field collapsing: its limit then counts videos too).
+        per_video = config.GROUPED_FRAMES_PER_VIDEO if grouped else 0
+        vector_limit = candidate_depth(top_k * max(1, per_video), config.MILVUS_MAX_CANDIDATES)
+        content_limit = candidate_depth(top_k, config.ES_FRAMES_MAX_CANDIDATES)
+        meta_limit = candidate_depth(top_k, config.ES_METADATA_MAX_CANDIDATES)
+
+        # A failing or slow backend contributes an empty result; the others are still fused.
+        if self.sharded_index:
+            vector_scores = self.backends["sharded_keyframes"].call(
+                self.sharded_index.search_keyframes, query_vector, limit=vector_limit, min_keep=top_k,
+                per_video=per_video, deadline=deadline, fallback={}
+            )
+        else:
+            vector_scores = self.backends["milvus_keyframes"].call(
+                milvus_retriever.search_keyframes, self.keyframes_collection, query_vector,
+                limit=vector_limit, min_keep=top_k, per_video=per_video, deadline=deadline, fallback={}
+            )
+        meta_scores = self.backends["es_metadata"].call(
+            es_retriever.search_metadata, self.es, metadata, limit=meta_limit, min_keep=top_k,
+            deadline=deadline, fallback={}
+        )
+        content_scores = self.backends["es_keyframes"].call(
+            es_retriever.search_keyframes, self.es, text, object_list, limit=content_limit, min_keep=top_k,
+            per_video=per_video, deadline=deadline, fallback={}
+        )
 
         logger.info("2/3: Fusing retrieval results...")
         ranked_vector_scores = sorted(vector_scores.items(), key=lambda item: item[1])
@@ -121,6 +189,9 @@ class HybridVideoRetrievalSystem:
         
         fused_scores = rrf_ranker([ranked_vector_scores, ranked_content_scores, ranked_meta_scores])
         ranked_fused_scores = sorted(fused_scores.items(), key=lambda item: item[1], reverse=True)
+
+        if grouped:
+            return self._grouped_results(fused_scores, vector_scores, content_scores, meta_scores, aggregation, top_k)
         
         NUM_CANDIDATES_TO_RERANK = top_k * 5
         candidates_for_reranking = [key for key, score in ranked_fused_scores[:NUM_CANDIDATES_TO_RERANK]]
@@ -149,4 +220,53 @@ class HybridVideoRetrievalSystem:
             })
             
         logger.info(f"Search complete. {results}")
-        return results
\ No newline at end of file
+        return results
+
+    def _grouped_results(self, fused_scores, vector_scores, content_scores, meta_scores, aggregation, top_k):
+        """Collapses fused frame scores into the top_k videos, each with its best frames."""
+        logger.info(f"3/3: Grouping frames by video ({aggregation})...")
+        ranked_videos = group_by_video(fused_scores, aggregation=aggregation, limit=top_k)
+
+        results = []
+        for video_id, video_score, best_frames in ranked_videos:
+            results.append({
+                "video_id": video_id,
+                "video_score": video_score,
+                "metadata_score": meta_scores.get(video_id),
+                "best_frames": [{
+                    "keyframe_index": key[1],
+                    "vector_score": vector_scores.get(key),
+                    "content_score": content_scores.get(key),
+                    "rrf_score": frame_score
+                } for key, frame_score in best_frames]
+            })
+
+        logger.info(f"Grouped search complete. {len(results)} videos.")
+        return results
+
+    def backend_stats(self) -> dict:
+        """Health and latency statistics for each retrieval backend."""
+        return {name: backend.stats() for name, backend in self.backends.items()}
+
+    def similar(self, video_id: str, keyframe_index: int, top_k: int = 20):
+        """
+        Returns the keyframes most visually similar to the given one, read from the
+        precomputed kNN graph (no model inference or vector search).
+        Returns None if the keyframe is not in the graph.
+        """
+        neighbors = self.knn_graph.similar(video_id, keyframe_index, top_k)
+        if neighbors is None:
+            return None
+
+        results = []
+        for (vid, frame_idx), distance in neighbors:
+            results.append({
+                "video_id": vid,
+                "keyframe_index": frame_idx,
+                "vector_score": distance,
+                "content_score": None,
+                "metadata_score": None,
+                "rrf_score": None,
+                "rerank_score": None
+            })
+        return results
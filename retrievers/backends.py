@@ -0,0 +1,145 @@
+import logging
+import threading
+import time
+from collections import deque
+import config
+
+logger = logging.getLogger(__name__)
+
+def create_es_client():
+    """
+    Creates the shared Elasticsearch client.
+    Connections are pooled per node and kept alive between requests. Retries are kept
+    low because each call gets its own deadline from the request budget.
+    """
+    from elasticsearch import Elasticsearch
+
+    return Elasticsearch(
+        f"http://{config.ES_HOST}:{config.ES_PORT}",
+        connections_per_node=config.ES_POOL_SIZE,
+        request_timeout=config.SEARCH_BUDGET_S,
+        max_retries=config.ES_MAX_RETRIES,
+        retry_on_timeout=False,
+        http_compress=True
+    )
+
+def connect_milvus(alias: str = "default"):
+    """Opens the global pymilvus connection with gRPC keepalive enabled."""
+    from pymilvus import connections
+
+    connections.connect(
+        alias,
+        host=config.MILVUS_HOST,
+        port=config.MILVUS_PORT,
+        keep_alive=True,
+        timeout=config.SEARCH_BUDGET_S
+    )
+
+class Deadline:
+    """The remaining time of a request budget, shared by all backend calls of one search."""
+    def __init__(self, budget_s: float = config.SEARCH_BUDGET_S):
+        self.expires_at = time.monotonic() + budget_s
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+class CircuitBreaker:
+    """
+    Skips a backend after `failure_threshold` consecutive failures.
+    After `reset_timeout_s` a single trial call is let through (half-open); its
+    outcome closes the breaker again or re-opens it.
+    """
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int = config.BREAKER_FAILURE_THRESHOLD,
+                 reset_timeout_s: float = config.BREAKER_RESET_TIMEOUT_S):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_s = reset_timeout_s
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout_s:
+                self.state = self.HALF_OPEN
+                return True
+            return self.state == self.CLOSED
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+class Backend:
+    """
+    Wraps calls to one retrieval backend with a circuit breaker, a per-call deadline
+    and latency / error statistics.
+    """
+    def __init__(self, name: str, latency_window: int = 1000):
+        self.name = name
+        self.breaker = CircuitBreaker()
+        self.latencies = deque(maxlen=latency_window)
+        self.calls = 0
+        self.failures = 0
+        self.skipped = 0
+        self.last_error = None
+        self._lock = threading.Lock()
+
+    def call(self, func, *args, deadline: Deadline = None, fallback=None, **kwargs):
+        """
+        Calls `func(*args, timeout=..., **kwargs)` with the time left in `deadline`.
+        Returns `fallback` instead of raising if the breaker is open, the budget is spent
+        or the call fails, so the caller can fuse the remaining retrievers.
+        """
+        timeout = deadline.remaining() if deadline else config.SEARCH_BUDGET_S
+        if timeout < config.MIN_BACKEND_TIMEOUT_S or not self.breaker.allow():
+            with self._lock:
+                self.skipped += 1
+            logger.warning(f"Skipping backend '{self.name}' (breaker {self.breaker.state}, {timeout:.2f}s left).")
+            return fallback
+
+        start = time.perf_counter()
+        try:
+            result = func(*args, timeout=timeout, **kwargs)
+        except Exception as e:
+            self.breaker.record_failure()
+            with self._lock:
+                self.calls += 1
+                self.failures += 1
+                self.last_error = str(e)
+                self.latencies.append(time.perf_counter() - start)
+            logger.error(f"Backend '{self.name}' failed: {e}")
+            return fallback
+
+        self.breaker.record_success()
+        with self._lock:
+            self.calls += 1
+            self.latencies.append(time.perf_counter() - start)
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            latencies = sorted(self.latencies)
+            calls, failures, skipped, last_error = self.calls, self.failures, self.skipped, self.last_error
+
+        def percentile(p):
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 2) if latencies else None
+
+        return {
+            "state": self.breaker.state,
+            "healthy": self.breaker.state == CircuitBreaker.CLOSED,
+            "calls": calls,
+            "failures": failures,
+            "skipped": skipped,
+            "last_error": last_error,
+            "latency_ms": {"p50": percentile(0.5), "p95": percentile(0.95), "p99": percentile(0.99)}
+        }
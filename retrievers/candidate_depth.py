@@ -0,0 +1,34 @@
+from collections import Counter
+import config
+
+def candidate_depth(top_k: int, max_depth: int, multiplier: int = config.CANDIDATE_MULTIPLIER,
+                    min_depth: int = config.MIN_CANDIDATE_DEPTH) -> int:
+    """Number of candidates to fetch from a retriever for `top_k` final results."""
+    return max(min_depth, min(max_depth, top_k * multiplier))
+
+def score_cutoff(ranked_hits, min_keep: int, ratio: float, higher_is_better: bool = True):
+    """
+    Yields (key, score) pairs from a best-first iterable until the scores drop off.
+    The first `min_keep` hits are always kept. After that, iteration stops at the first
+    hit scoring below `ratio` * best score (or, for distances, above best score / `ratio`).
+    A ratio of a score <= 0 is meaningless (e.g. distance 0 for a duplicate of the query vector),
+    so the reference only becomes the best score once it is positive.
+    """
+    best = None
+    for rank, (key, score) in enumerate(ranked_hits):
+        if best is not None and best > 0 and rank >= min_keep:
+            if higher_is_better and score < best * ratio:
+                return
+            if not higher_is_better and score * ratio > best:
+                return
+        if best is None or best <= 0:
+            best = score
+        yield key, score
+
+def cap_per_video(ranked_hits, per_video: int):
+    """Yields ((video_id, keyframe_index), score) pairs, skipping all but the first `per_video` frames of each video."""
+    seen = Counter()
+    for key, score in ranked_hits:
+        seen[key[0]] += 1
+        if seen[key[0]] <= per_video:
+            yield key, score
@@ -1,13 +1,16 @@
 from elasticsearch import Elasticsearch
 import logging
 import config
+from retrievers.candidate_depth import score_cutoff
 
 logger = logging.getLogger(__name__)
 
-def search_metadata(es_client: Elasticsearch, text_query: str, limit=500) -> dict:
+def search_metadata(es_client: Elasticsearch, text_query: str, limit=500, min_keep=0, timeout=None) -> dict:
     """
     Searches the metadata index in Elasticsearch.
     Handles empty queries by returning all documents with a neutral score.
+    Only `_id` and `_score` are transferred; hits past the score drop-off (after `min_keep`) are dropped.
+    Errors are raised so that the caller's circuit breaker can see them.
     """
     # --- Input Validation ---
     if not (text_query and text_query.strip()):
@@ -24,21 +27,27 @@ def search_metadata(es_client: Elasticsearch, text_query: str, limit=500) -> dic
             }
         }
     
-    try:
-        resp = es_client.search(
-            index=config.METADATA_INDEX_NAME,
-            size=limit,
-            query=query,
-            request_cache=True 
-        )
-        return {hit['_id']: hit['_score'] for hit in resp['hits']['hits']}
+    resp = es_client.options(request_timeout=timeout).search(
+        index=config.METADATA_INDEX_NAME,
+        size=limit,
+        query=query,
+        source=False,
+        track_total_hits=False,
+        filter_path=["hits.hits._id", "hits.hits._score"],
+        request_cache=True 
+    )
+    hits = resp['hits']['hits'] if 'hits' in resp else [] # filter_path drops empty results
+    return dict(score_cutoff(((hit['_id'], hit['_score']) for hit in hits), min_keep, config.ES_SCORE_CUTOFF))
 
-    except Exception as e:
-        logger.error(f"Error searching metadata in Elasticsearch: {e}")
-        return {}
-
-def search_keyframes(es_client: Elasticsearch, text_query: str, objects: list, limit=1000) -> dict:
-    """Searches the frames index in Elasticsearch for OCR text and detected objects."""
+def search_keyframes(es_client: Elasticsearch, text_query: str, objects: list, limit=1000, min_keep=0,
+                     per_video=0, timeout=None) -> dict:
+    """
+    Searches the frames index in Elasticsearch for OCR text and detected objects.
+    Reads `video_id` / `keyframe_index` from doc values instead of `_source` (which holds the long OCR text),
+    and drops hits past the score drop-off (after `min_keep`).
+    If `per_video` > 0, hits are collapsed on `video_id`: `limit` and `min_keep` then count videos,
+    and only the best `per_video` frames of each video are returned.
+    """
     logger.info(f"Searching ES frames with text='{text_query}' and objects={objects}")
     
     must_clauses = []
@@ -110,12 +119,64 @@ def search_keyframes(es_client: Elasticsearch, text_query: str, objects: list, l
             # If there is no query at all
             query = {"match_all": {}}
 
-    resp = es_client.search(index=config.ES_FRAMES_INDEX_NAME, size=limit, query=query, request_cache=True)
+    if per_video:
+        return _search_keyframes_collapsed(es_client, query, limit, min_keep, per_video, timeout)
+
+    resp = es_client.options(request_timeout=timeout).search(
+        index=config.ES_FRAMES_INDEX_NAME,
+        size=limit,
+        query=query,
+        source=False,
+        docvalue_fields=["video_id", "keyframe_index"],
+        track_total_hits=False,
+        filter_path=["hits.hits._score", "hits.hits.fields"],
+        request_cache=True
+    )
     
-    frame_scores = {}
-    for hit in resp['hits']['hits']:
-        source = hit['_source']
-        frame_scores[(source['video_id'], source['keyframe_index'])] = hit['_score']
+    hits = resp['hits']['hits'] if 'hits' in resp else [] # filter_path drops empty results
+    ranked_hits = (
+        ((hit['fields']['video_id'][0], hit['fields']['keyframe_index'][0]), hit['_score']) for hit in hits
+    )
+    frame_scores = dict(score_cutoff(ranked_hits, min_keep, config.ES_SCORE_CUTOFF))
     
     logger.info(f"Found {len(frame_scores)} frames from ES frames search.")
-    return frame_scores
\ No newline at end of file
+    return frame_scores
+
+def _search_keyframes_collapsed(es_client: Elasticsearch, query: dict, limit: int, min_keep: int,
+                                per_video: int, timeout=None) -> dict:
+    """Field-collapsed frame search: the best `per_video` frames of each of the top `limit` videos."""
+    resp = es_client.options(request_timeout=timeout).search(
+        index=config.ES_FRAMES_INDEX_NAME,
+        size=limit,
+        query=query,
+        source=False,
+        collapse={
+            "field": "video_id",
+            "inner_hits": {
+                "name": "best_frames",
+                "size": per_video,
+                "_source": False,
+                "docvalue_fields": ["keyframe_index"]
+            }
+        },
+        track_total_hits=False,
+        filter_path=[
+            "hits.hits._score",
+            "hits.hits.fields",
+            "hits.hits.inner_hits.best_frames.hits.hits._score",
+            "hits.hits.inner_hits.best_frames.hits.hits.fields"
+        ],
+        request_cache=True
+    )
+
+    hits = resp['hits']['hits'] if 'hits' in resp else [] # filter_path drops empty results
+    ranked_videos = ((hit, hit['_score']) for hit in hits)
+
+    frame_scores = {}
+    for hit, _ in score_cutoff(ranked_videos, min_keep, config.ES_SCORE_CUTOFF):
+        video_id = hit['fields']['video_id'][0]
+        for frame in hit['inner_hits']['best_frames']['hits']['hits']:
+            frame_scores[(video_id, frame['fields']['keyframe_index'][0])] = frame['_score']
+
+    logger.info(f"Found {len(frame_scores)} frames in {len(hits)} videos from collapsed ES frames search.")
+    return frame_scores
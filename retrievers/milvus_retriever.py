@@ -1,10 +1,20 @@
-from pymilvus import Collection
+from typing import TYPE_CHECKING
 import logging
+import config
+from retrievers.candidate_depth import score_cutoff, cap_per_video
+
+if TYPE_CHECKING:
+    from pymilvus import Collection
 
 logger = logging.getLogger(__name__)
 
-def search_keyframes(collection: Collection, query_vector, limit=500) -> dict:
-    """Searches the keyframe collection in Milvus."""
+def search_keyframes(collection: "Collection", query_vector, limit=500, min_keep=0, per_video=0, timeout=None) -> dict:
+    """
+    Searches the keyframe collection in Milvus.
+    Hits past the distance drop-off (after `min_keep`) are dropped.
+    If `per_video` > 0, only the closest `per_video` frames of each video are kept
+    (client-side: grouping search needs Milvus 2.4+, docker-compose runs 2.3).
+    """
     logger.info("Searching Milvus keyframe collection...")
     search_params = {"metric_type": "L2", "params": {"nprobe": 10}}
     
@@ -13,15 +23,16 @@ def search_keyframes(collection: Collection, query_vector, limit=500) -> dict:
         anns_field="keyframe_vector", 
         param=search_params,
         limit=limit,
-        output_fields=["video_id", "keyframe_index"]
+        output_fields=["video_id", "keyframe_index"],
+        timeout=timeout
     )
     
     keyframe_scores = {}
     if results:
-        for hit in results[0]:
-            vid = hit.entity.get('video_id')
-            frame_idx = hit.entity.get('keyframe_index')
-            keyframe_scores[(vid, frame_idx)] = hit.distance
+        ranked_hits = (((hit.entity.get('video_id'), hit.entity.get('keyframe_index')), hit.distance) for hit in results[0])
+        if per_video:
+            ranked_hits = cap_per_video(ranked_hits, per_video)
+        keyframe_scores = dict(score_cutoff(ranked_hits, min_keep, config.VECTOR_DISTANCE_CUTOFF, higher_is_better=False))
             
-    logger.info(f"Found {len(results[0])} potential keyframes from Milvus.")
+    logger.info(f"Found {len(keyframe_scores)} potential keyframes from Milvus.")
     return keyframe_scores
\ No newline at end of file
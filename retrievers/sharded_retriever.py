@@ -0,0 +1,223 @@
+import heapq
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import zlib
+from multiprocessing.connection import Client, Listener
+import numpy as np
+import config
+from retrievers.candidate_depth import score_cutoff, cap_per_video
+
+logger = logging.getLogger(__name__)
+
+def shard_of(video_id: str, num_shards: int) -> int:
+    """Stable shard assignment: all keyframes of a video live on the same shard."""
+    return zlib.crc32(video_id.encode('utf-8')) % num_shards
+
+class KeyframeShard:
+    """
+    One partition of the keyframe vectors, held in RAM and searched by brute-force L2
+    (the same metric as the Milvus collection).
+    """
+    def __init__(self, shard_id: int, num_shards: int, data_dir: str = config.COMPACT_DATA_DIR):
+        from utils.columnar_store import KeyframeStore
+
+        store = KeyframeStore(data_dir)
+        shard_by_video = {vid: shard_of(vid, num_shards) for vid in set(store.video_ids)}
+        rows = np.flatnonzero([shard_by_video[vid] == shard_id for vid in store.video_ids])
+
+        self.vectors = np.ascontiguousarray(store.vectors[rows], dtype=np.float32)
+        self.sq_norms = np.einsum('ij,ij->i', self.vectors, self.vectors)
+        self.keys = [store.key(row) for row in rows]
+        logger.info(f"Shard {shard_id}/{num_shards} loaded with {len(self.keys)} keyframes.")
+
+    def search(self, query_vector, limit: int):
+        """
+        Returns:
+            tuple: (distances, keys) of the `limit` nearest keyframes, closest first.
+        """
+        query = np.asarray(query_vector, dtype=np.float32).reshape(-1)
+        distances = self.sq_norms - 2 * (self.vectors @ query) + query @ query
+        limit = min(limit, len(distances))
+        if limit == 0:
+            return [], []
+        top = np.argpartition(distances, limit - 1)[:limit]
+        top = top[np.argsort(distances[top])]
+        return distances[top].tolist(), [self.keys[i] for i in top]
+
+def serve_shard(conn, shard: KeyframeShard):
+    """Answers search requests on one connection until it is closed or told to stop."""
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            return
+        if message[0] == "stop":
+            return
+        _, request_id, query_vector, limit = message
+        try:
+            distances, keys = shard.search(query_vector, limit)
+            conn.send(("ok", request_id, distances, keys))
+        except Exception as e:
+            conn.send(("error", request_id, str(e), None))
+
+def _run_local_shard(conn, shard_id: int, num_shards: int, data_dir: str):
+    shard = KeyframeShard(shard_id, num_shards, data_dir)
+    conn.send(("ready", shard_id))
+    serve_shard(conn, shard)
+
+def run_shard_server(shard_id: int, num_shards: int, port: int, authkey: str,
+                     host: str = config.SHARD_BIND_HOST, data_dir: str = config.COMPACT_DATA_DIR):
+    """
+    Serves one shard over TCP so it can run on a separate node (see shard_worker.py).
+    Messages are pickled, so only clients that know `authkey` are accepted.
+    """
+    if not authkey:
+        raise ValueError("A shard authkey is required to serve a shard.")
+    from utils import columnar_store
+
+    if not columnar_store.is_fresh(data_dir):
+        raise RuntimeError(f"No up-to-date compacted keyframes in '{data_dir}'. Run compact_data.py first.")
+    shard = KeyframeShard(shard_id, num_shards, data_dir)
+    with Listener((host, port), authkey=authkey.encode()) as listener:
+        logger.info(f"Shard {shard_id}/{num_shards} listening on {host}:{port}.")
+        while True:
+            conn = listener.accept()
+            threading.Thread(target=serve_shard, args=(conn, shard), daemon=True).start()
+
+class ShardedKeyframeIndex:
+    """
+    Scatter-gather keyframe search over N shards partitioned by video_id hash.
+    Shards are either local worker processes or remote shard servers given by `addresses`.
+    Many queries can be in flight at once: one reader thread per shard connection hands each
+    reply to the queue of the request it belongs to.
+    """
+    def __init__(self, num_shards: int = config.KEYFRAME_SHARDS, addresses: list = None,
+                 data_dir: str = config.COMPACT_DATA_DIR):
+        self.processes = []
+        self.conns = []
+        self._request_ids = itertools.count()
+        self._send_locks = []
+        self._pending = {} # request_id -> queue.Queue of shard replies
+        self._pending_lock = threading.Lock()
+        self._broken = None # Set once a shard connection is lost
+
+        if addresses:
+            if not config.SHARD_AUTHKEY:
+                raise ValueError("Remote keyframe shards need the AIC_SHARD_AUTHKEY environment variable.")
+            for address in addresses:
+                host, port = address.rsplit(":", 1)
+                self.conns.append(Client((host, int(port)), authkey=config.SHARD_AUTHKEY.encode()))
+            self._start_readers()
+            logger.info(f"Connected to {len(self.conns)} remote keyframe shards.")
+            return
+
+        from utils.columnar_store import VECTORS_FILE, KEYFRAMES_FILE
+
+        missing = [name for name in (VECTORS_FILE, KEYFRAMES_FILE) if not os.path.exists(os.path.join(data_dir, name))]
+        if missing:
+            raise FileNotFoundError(f"Keyframe shards need {', '.join(missing)} in '{data_dir}'. Run compact_data.py first.")
+
+        ctx = multiprocessing.get_context("spawn")
+        # Split the cores between the workers so their BLAS thread pools do not oversubscribe.
+        threads = str(max(1, (os.cpu_count() or 1) // num_shards))
+        saved_env = {var: os.environ.get(var) for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS")}
+        os.environ.update({var: threads for var in saved_env})
+        try:
+            for shard_id in range(num_shards):
+                parent_conn, child_conn = ctx.Pipe()
+                process = ctx.Process(target=_run_local_shard, args=(child_conn, shard_id, num_shards, data_dir), daemon=True)
+                process.start()
+                self.processes.append(process)
+                self.conns.append(parent_conn)
+        finally:
+            for var, value in saved_env.items():
+                if value is None:
+                    os.environ.pop(var, None)
+                else:
+                    os.environ[var] = value
+
+        for shard_id, conn in enumerate(self.conns):
+            try:
+                conn.recv() # Wait for the shard to finish loading
+            except EOFError:
+                self.close()
+                raise RuntimeError(f"Keyframe shard worker {shard_id} exited while loading (see its log).")
+        self._start_readers()
+        logger.info(f"Started {num_shards} local keyframe shard workers.")
+
+    def _start_readers(self):
+        for conn in self.conns:
+            self._send_locks.append(threading.Lock())
+            threading.Thread(target=self._read_replies, args=(conn,), daemon=True).start()
+
+    def _read_replies(self, conn):
+        """Routes each reply on `conn` to the waiting request; replies to requests that timed out are dropped."""
+        while True:
+            try:
+                status, reply_id, payload, keys = conn.recv()
+            except (EOFError, OSError):
+                self._broken = "Keyframe shard connection closed."
+                with self._pending_lock:
+                    for replies in self._pending.values():
+                        replies.put(("error", self._broken, None))
+                return
+            with self._pending_lock:
+                replies = self._pending.get(reply_id)
+            if replies is not None:
+                replies.put((status, payload, keys))
+
+    def search_keyframes(self, query_vector, limit=500, min_keep=0, per_video=0, timeout=None) -> dict:
+        """
+        Scatters the query to all shards and merges their top-k lists with a heap.
+        Same return format as milvus_retriever.search_keyframes: {(video_id, keyframe_index): L2 distance}.
+        """
+        if self._broken:
+            raise RuntimeError(self._broken)
+        query = np.asarray(query_vector, dtype=np.float32).reshape(-1)
+        replies = queue.Queue()
+        with self._pending_lock:
+            request_id = next(self._request_ids)
+            self._pending[request_id] = replies
+        try:
+            for conn, send_lock in zip(self.conns, self._send_locks):
+                with send_lock:
+                    conn.send(("search", request_id, query, limit))
+
+            deadline = None if timeout is None else time.monotonic() + timeout
+            shard_results = []
+            for _ in self.conns:
+                remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+                try:
+                    status, distances, keys = replies.get(timeout=remaining)
+                except queue.Empty:
+                    raise TimeoutError("Keyframe shard did not answer within the deadline.")
+                if status != "ok":
+                    raise RuntimeError(f"Keyframe shard failed: {distances}")
+                shard_results.append(zip(distances, keys))
+        finally:
+            with self._pending_lock:
+                self._pending.pop(request_id, None)
+
+        merged = heapq.merge(*shard_results, key=lambda item: item[0])
+        ranked_hits = ((key, distance) for distance, key in itertools.islice(merged, limit))
+        if per_video:
+            ranked_hits = cap_per_video(ranked_hits, per_video)
+        keyframe_scores = dict(score_cutoff(ranked_hits, min_keep, config.VECTOR_DISTANCE_CUTOFF, higher_is_better=False))
+        logger.info(f"Found {len(keyframe_scores)} potential keyframes from {len(self.conns)} shards.")
+        return keyframe_scores
+
+    def close(self):
+        for conn, send_lock in itertools.zip_longest(self.conns, self._send_locks, fillvalue=threading.Lock()):
+            try:
+                with send_lock:
+                    conn.send(("stop",))
+                conn.close()
+            except OSError:
+                pass
+        for process in self.processes:
+            process.join(timeout=5)
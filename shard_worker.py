@@ -0,0 +1,32 @@
+"""
+Runs one keyframe shard as a standalone server, so shards can live on separate nodes.
+List the servers in config.KEYFRAME_SHARD_ADDRESSES to search them from the app.
+
+Shard traffic is pickled, so the server only accepts clients that know the shared authkey.
+There is no default: set AIC_SHARD_AUTHKEY (preferred) or pass --authkey. The server binds
+to config.SHARD_BIND_HOST (localhost) unless --host is given.
+
+Usage:
+    AIC_SHARD_AUTHKEY=<secret> python shard_worker.py --shard 0 --num-shards 4 --port 6000 --host 10.0.0.5
+"""
+import argparse
+import logging
+
+import config
+from retrievers.sharded_retriever import run_shard_server
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] - %(message)s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve one keyframe shard.")
+    parser.add_argument("--shard", type=int, required=True, help="Shard id, in [0, num-shards)")
+    parser.add_argument("--num-shards", type=int, required=True)
+    parser.add_argument("--port", type=int, default=6000)
+    parser.add_argument("--host", default=config.SHARD_BIND_HOST, help="Interface to listen on")
+    parser.add_argument("--authkey", default=config.SHARD_AUTHKEY,
+                        help="Shared secret (default: $AIC_SHARD_AUTHKEY)")
+    args = parser.parse_args()
+
+    if not args.authkey:
+        parser.error("no shard authkey: set AIC_SHARD_AUTHKEY or pass --authkey")
+    run_shard_server(args.shard, args.num_shards, args.port, args.authkey, host=args.host)
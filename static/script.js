@@ -38,6 +38,8 @@ document.addEventListener('DOMContentLoaded', () => {
             query: formData.get('query'),
             text: formData.get('text'),
             metadata: formData.get('metadata'),
+            group_by_video: formData.get('group_by_video') === 'on',
+            aggregation: formData.get('aggregation'),
             objects: []
         };
         
@@ -64,6 +66,12 @@ document.addEventListener('DOMContentLoaded', () => {
      * Uses event delegation for efficiency.
      */
     resultsContainer.addEventListener('click', (e) => {
+        const similarBtn = e.target.closest('.similar-btn');
+        if (similarBtn) {
+            performSimilarSearch(similarBtn.dataset.videoId, parseInt(similarBtn.dataset.keyframeIndex));
+            return;
+        }
+
         const resultImage = e.target.closest('.result-item-image');
         if (resultImage) {
             const videoId = resultImage.dataset.videoId;
@@ -150,6 +158,32 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
+    /**
+     * Fetches the frames most similar to a given keyframe and displays them.
+     * @param {string} videoId - The video of the source keyframe.
+     * @param {number} keyframeIndex - The index of the source keyframe.
+     */
+    async function performSimilarSearch(videoId, keyframeIndex) {
+        resultsContainer.innerHTML = '<p>Finding similar frames...</p>';
+
+        try {
+            const response = await fetch(`/similar/${videoId}/${keyframeIndex}`);
+
+            if (!response.ok) {
+                const errorData = await response.json();
+                throw new Error(errorData.error || `HTTP error! status: ${response.status}`);
+            }
+
+            currentResults = await response.json();
+            displayResults(currentResults);
+
+        } catch (error) {
+            console.error('Similar-frame search failed:', error);
+            currentResults = [];
+            resultsContainer.innerHTML = `<p style="color: red;">An error occurred: ${error}</p>`;
+        }
+    }
+
     /**
      * Sorts and renders the search results into the UI.
      * @param {Array} results - The array of result objects to display.
@@ -160,6 +194,12 @@ document.addEventListener('DOMContentLoaded', () => {
             return;
         }
 
+        // Grouped results are already ranked by video score on the backend
+        if (results[0].best_frames) {
+            displayGroupedResults(results);
+            return;
+        }
+
         // --- Sorting Logic ---
         const sortBy = sortBySelect.value;
         const sortedResults = [...results]; // Create a copy to sort
@@ -205,6 +245,12 @@ document.addEventListener('DOMContentLoaded', () => {
                 >
                 <div class="result-info">
                     <h3>${item.video_id} / Frame ${item.keyframe_index}</h3>
+                    <button
+                        type="button"
+                        class="similar-btn"
+                        data-video-id="${item.video_id}"
+                        data-keyframe-index="${item.keyframe_index}"
+                    >Similar frames</button>
                     <p class="${sortBy === 'rerank_score' ? 'sorted-by' : ''}">
                         <strong>Re-Rank Score: ${item.rerank_score ? item.rerank_score.toFixed(4) : 'N/A'}</strong>
                     </p>
@@ -230,6 +276,43 @@ document.addEventListener('DOMContentLoaded', () => {
         });
     }
 
+    /**
+     * Renders video-level results: one card per video with its best frames.
+     * @param {Array} videos - The array of grouped video results to display.
+     */
+    function displayGroupedResults(videos) {
+        resultsContainer.innerHTML = '';
+
+        videos.forEach(video => {
+            const videoElement = document.createElement('div');
+            videoElement.classList.add('result-item');
+
+            const framesHTML = video.best_frames.map(frame => `
+                <img 
+                    src="/frames/${video.video_id}/${frame.keyframe_index}" 
+                    alt="Frame ${frame.keyframe_index} from ${video.video_id}" 
+                    class="result-item-image grouped-frame" 
+                    data-video-id="${video.video_id}"
+                    data-keyframe-index="${frame.keyframe_index}"
+                    title="Frame ${frame.keyframe_index} (RRF: ${frame.rrf_score.toFixed(4)})"
+                    onerror="this.onerror=null;this.src='/static/placeholder.png';"
+                >
+            `).join('');
+
+            videoElement.innerHTML = `
+                <div class="grouped-frames">${framesHTML}</div>
+                <div class="result-info">
+                    <h3>${video.video_id}</h3>
+                    <div class="result-scores">
+                        <span>Video Score: ${video.video_score.toFixed(4)}</span><br>
+                        <span>Metadata Score: ${video.metadata_score ? video.metadata_score.toFixed(4) : 'N/A'}</span>
+                    </div>
+                </div>
+            `;
+            resultsContainer.appendChild(videoElement);
+        });
+    }
+
     /**
      * Opens the video player modal.
      * @param {string} videoId - The ID of the video to play.
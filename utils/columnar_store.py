@@ -0,0 +1,200 @@
+import json
+import logging
+import os
+from collections import defaultdict
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import config
+
+logger = logging.getLogger(__name__)
+
+VECTORS_FILE = "keyframe_vectors.npy"
+KEYFRAMES_FILE = "keyframes.parquet" # Row i describes row i of VECTORS_FILE
+OCR_FILE = "ocr.parquet"
+OBJECTS_FILE = "objects.parquet"
+MANIFEST_FILE = "manifest.json" # Fingerprint of the raw sources and settings the files were built from
+
+KEYFRAMES_SCHEMA = pa.schema([("video_id", pa.string()), ("keyframe_index", pa.int32())])
+OCR_SCHEMA = pa.schema([("video_id", pa.string()), ("keyframe_index", pa.int32()), ("ocr_text", pa.string())])
+OBJECTS_SCHEMA = pa.schema([
+    ("video_id", pa.string()), ("keyframe_index", pa.int32()),
+    ("label", pa.string()), ("count", pa.int32())
+])
+
+def is_available(data_dir: str = config.COMPACT_DATA_DIR) -> bool:
+    """True if the compacted files have been built in `data_dir`."""
+    return all(os.path.exists(os.path.join(data_dir, name))
+               for name in (VECTORS_FILE, KEYFRAMES_FILE, OCR_FILE, OBJECTS_FILE))
+
+def _dir_fingerprint(path: str) -> dict:
+    """
+    Entry count and latest mtime of `path` and its direct entries, or None if `path` does not exist.
+    Only one level is read: a per-video subdirectory (as in OBJECT_DETECTION_DIR) counts by its
+    own mtime, which changes when keyframe files are added, removed or replaced, not edited in place.
+    """
+    try:
+        entries = list(os.scandir(path))
+    except FileNotFoundError:
+        return None
+    latest = max([os.stat(path).st_mtime_ns] + [entry.stat().st_mtime_ns for entry in entries])
+    return {"entries": len(entries), "latest_mtime_ns": latest}
+
+def source_fingerprint() -> dict:
+    """Fingerprint of the raw ingestion sources and the settings baked into the compacted files."""
+    return {
+        "sources": {
+            path: _dir_fingerprint(path)
+            for path in (config.CLIP_FEATURES_DIR, config.METADATA_DIR, config.OCR_DIR, config.OBJECT_DETECTION_DIR)
+        },
+        "od_score_threshold": config.OD_SCORE_THRESHOLD
+    }
+
+def write_manifest(fingerprint: dict, data_dir: str = config.COMPACT_DATA_DIR):
+    with open(os.path.join(data_dir, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(fingerprint, f, indent=2)
+
+def is_fresh(data_dir: str = config.COMPACT_DATA_DIR) -> bool:
+    """
+    True if the compacted files exist and were built from the current raw sources and settings.
+    Raw source directories that no longer exist are not compared, so the compacted files can
+    replace them. Logs a warning explaining why they are not used otherwise.
+    """
+    if not is_available(data_dir):
+        return False
+    manifest_path = os.path.join(data_dir, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        logger.warning(f"⚠️ No {MANIFEST_FILE} in '{data_dir}'. Ignoring compacted data; re-run compact_data.py.")
+        return False
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    current = source_fingerprint()
+    if manifest.get("od_score_threshold") != current["od_score_threshold"]:
+        logger.warning(f"⚠️ Compacted objects were built with OD_SCORE_THRESHOLD={manifest.get('od_score_threshold')}, "
+                       f"config has {current['od_score_threshold']}. Ignoring compacted data; re-run compact_data.py.")
+        return False
+    stale = [path for path, fp in current["sources"].items()
+             if fp is not None and manifest.get("sources", {}).get(path) != fp]
+    if stale:
+        logger.warning(f"⚠️ Raw data changed since compaction in: {', '.join(stale)}. "
+                       f"Ignoring compacted data; re-run compact_data.py.")
+        return False
+    return True
+
+def write_keyframe_vectors(video_vectors: list, data_dir: str = config.COMPACT_DATA_DIR):
+    """
+    Packs per-video vector files into one contiguous float32 .npy file.
+
+    Args:
+        video_vectors (list): List of (video_id, npy_path) tuples. Vectors are written in this order.
+    """
+    os.makedirs(data_dir, exist_ok=True)
+
+    # First pass only reads the .npy headers to size the output file.
+    shapes = [np.load(path, mmap_mode='r').shape for _, path in video_vectors]
+    total = sum(shape[0] for shape in shapes)
+    dim = shapes[0][1] if shapes else config.VECTOR_DIMENSION
+
+    out = np.lib.format.open_memmap(os.path.join(data_dir, VECTORS_FILE), mode='w+', dtype=np.float32, shape=(total, dim))
+    with pq.ParquetWriter(os.path.join(data_dir, KEYFRAMES_FILE), KEYFRAMES_SCHEMA) as writer:
+        offset = 0
+        for (video_id, path), shape in zip(video_vectors, shapes):
+            n = shape[0]
+            out[offset:offset + n] = np.load(path).astype(np.float32)
+            writer.write_table(pa.table({
+                "video_id": [video_id] * n,
+                "keyframe_index": np.arange(n, dtype=np.int32)
+            }, schema=KEYFRAMES_SCHEMA))
+            offset += n
+    out.flush()
+    logger.info(f"Packed {total} keyframe vectors from {len(video_vectors)} videos.")
+
+def write_table_rows(rows_by_video, path: str, schema: pa.Schema):
+    """
+    Writes an iterable of per-video column dicts to a Parquet file, one row group per batch.
+    Keeps only one video's rows in memory at a time.
+    """
+    with pq.ParquetWriter(path, schema) as writer:
+        for columns in rows_by_video:
+            if columns and len(columns["video_id"]):
+                writer.write_table(pa.table(columns, schema=schema))
+
+def iter_video_rows(path: str, columns: list, batch_size: int = 65536):
+    """
+    Yields (video_id, rows) per video from a Parquet file written sorted by video_id (see compact_data.py).
+    Reads only `columns` (the first must be "video_id"), one memory-mapped batch at a time;
+    `rows` are tuples of the remaining columns.
+    """
+    parquet_file = pq.ParquetFile(path, memory_map=True)
+    current, rows = None, []
+    for batch in parquet_file.iter_batches(batch_size=batch_size, columns=columns):
+        cols = [batch.column(name).to_pylist() for name in columns]
+        for video_id, *values in zip(*cols):
+            if video_id != current:
+                if rows:
+                    yield current, rows
+                current, rows = video_id, []
+            rows.append(tuple(values))
+    if rows:
+        yield current, rows
+
+def iter_frames_by_video(data_dir: str = config.COMPACT_DATA_DIR):
+    """
+    Merge-joins the OCR and object Parquet files on video_id, one video at a time.
+
+    Yields:
+        tuple: (video_id, {keyframe_index: ocr_text}, {keyframe_index: {label: count}})
+    """
+    ocr_videos = iter_video_rows(os.path.join(data_dir, OCR_FILE), ["video_id", "keyframe_index", "ocr_text"])
+    obj_videos = iter_video_rows(os.path.join(data_dir, OBJECTS_FILE), ["video_id", "keyframe_index", "label", "count"])
+    ocr_next, obj_next = next(ocr_videos, None), next(obj_videos, None)
+
+    while ocr_next or obj_next:
+        video_id = min(v[0] for v in (ocr_next, obj_next) if v)
+        ocr_data, obj_data = {}, defaultdict(dict)
+        if ocr_next and ocr_next[0] == video_id:
+            ocr_data = dict(ocr_next[1])
+            ocr_next = next(ocr_videos, None)
+        if obj_next and obj_next[0] == video_id:
+            for frame_idx, label, count in obj_next[1]:
+                obj_data[frame_idx][label] = count
+            obj_next = next(obj_videos, None)
+        yield video_id, ocr_data, dict(obj_data)
+
+class KeyframeStore:
+    """
+    Read-only view over the compacted keyframe vectors.
+    The vector file is memory-mapped, so opening the store is cheap and only the
+    rows that are actually read get paged in.
+    """
+    def __init__(self, data_dir: str = config.COMPACT_DATA_DIR):
+        self.vectors = np.load(os.path.join(data_dir, VECTORS_FILE), mmap_mode='r')
+        cols = pq.read_table(os.path.join(data_dir, KEYFRAMES_FILE), memory_map=True)
+        self.video_ids = cols.column("video_id").to_numpy(zero_copy_only=False)
+        self.keyframe_indices = cols.column("keyframe_index").to_numpy()
+        self.row_of = {
+            (vid, int(idx)): row for row, (vid, idx) in enumerate(zip(self.video_ids, self.keyframe_indices))
+        }
+        logger.info(f"KeyframeStore opened with {len(self.row_of)} keyframes.")
+
+    def __len__(self):
+        return len(self.keyframe_indices)
+
+    def iter_videos(self):
+        """Yields (video_id, keyframe_indices, vectors) for each video, in file order."""
+        if not len(self):
+            return
+        boundaries = np.flatnonzero(self.video_ids[1:] != self.video_ids[:-1]) + 1
+        starts = np.concatenate(([0], boundaries))
+        ends = np.concatenate((boundaries, [len(self)]))
+        for start, end in zip(starts, ends):
+            yield self.video_ids[start], self.keyframe_indices[start:end], self.vectors[start:end]
+
+    def get_vector(self, video_id: str, keyframe_index: int):
+        """Returns the stored vector for a keyframe, or None if it is unknown."""
+        row = self.row_of.get((video_id, keyframe_index))
+        return None if row is None else self.vectors[row]
+
+    def key(self, row: int) -> tuple:
+        return (str(self.video_ids[row]), int(self.keyframe_indices[row]))
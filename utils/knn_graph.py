@@ -0,0 +1,90 @@
+import json
+import logging
+import os
+import numpy as np
+import config
+from utils.columnar_store import KeyframeStore, KEYFRAMES_FILE
+
+logger = logging.getLogger(__name__)
+
+NEIGHBORS_FILE = "knn_neighbors.npy" # int32 (num_keyframes, KNN_NEIGHBORS) row ids, -1 = none
+DISTANCES_FILE = "knn_distances.npy" # float16 (num_keyframes, KNN_NEIGHBORS) L2 distances
+GRAPH_META_FILE = "knn_graph.json" # Fingerprint of the keyframes file the row ids refer to
+
+def keyframes_fingerprint(data_dir: str = config.COMPACT_DATA_DIR) -> dict:
+    stat = os.stat(os.path.join(data_dir, KEYFRAMES_FILE))
+    return {"keyframes_size": stat.st_size, "keyframes_mtime_ns": stat.st_mtime_ns}
+
+def build_knn_graph(collection, store: KeyframeStore, num_neighbors: int = config.KNN_NEIGHBORS,
+                    batch_size: int = 256, data_dir: str = config.COMPACT_DATA_DIR):
+    """
+    Builds an approximate kNN graph over all keyframes by batch-searching every stored
+    vector against the Milvus IVF index. Neighbours are stored as row ids of `store`.
+    """
+    n = len(store)
+    fingerprint = keyframes_fingerprint(data_dir)
+    neighbors = np.lib.format.open_memmap(os.path.join(data_dir, NEIGHBORS_FILE), mode='w+',
+                                          dtype=np.int32, shape=(n, num_neighbors))
+    distances = np.lib.format.open_memmap(os.path.join(data_dir, DISTANCES_FILE), mode='w+',
+                                          dtype=np.float16, shape=(n, num_neighbors))
+    neighbors[:] = -1
+    distances[:] = np.inf
+    search_params = {"metric_type": "L2", "params": {"nprobe": config.KNN_NPROBE}}
+
+    for start in range(0, n, batch_size):
+        end = min(start + batch_size, n)
+        results = collection.search(
+            data=np.ascontiguousarray(store.vectors[start:end]),
+            anns_field="keyframe_vector",
+            param=search_params,
+            limit=num_neighbors + 1, # The query frame itself is usually the first hit
+            output_fields=["video_id", "keyframe_index"]
+        )
+        for row, hits in zip(range(start, end), results):
+            col = 0
+            for hit in hits:
+                neighbor_row = store.row_of.get((hit.entity.get('video_id'), hit.entity.get('keyframe_index')))
+                if neighbor_row is None or neighbor_row == row:
+                    continue
+                neighbors[row, col] = neighbor_row
+                distances[row, col] = hit.distance
+                col += 1
+                if col == num_neighbors:
+                    break
+        logger.info(f"kNN graph: {end}/{n} keyframes done.")
+
+    neighbors.flush()
+    distances.flush()
+    with open(os.path.join(data_dir, GRAPH_META_FILE), 'w', encoding='utf-8') as f:
+        json.dump(fingerprint, f)
+    logger.info(f"kNN graph saved to '{data_dir}'.")
+
+class KnnGraph:
+    """Memory-mapped, read-only kNN graph over the keyframes of a KeyframeStore."""
+    def __init__(self, store: KeyframeStore, data_dir: str = config.COMPACT_DATA_DIR):
+        with open(os.path.join(data_dir, GRAPH_META_FILE), 'r', encoding='utf-8') as f:
+            if json.load(f) != keyframes_fingerprint(data_dir):
+                raise ValueError("kNN graph was built for a different keyframes file. Rebuild it with build_knn_graph.py.")
+
+        self.store = store
+        self.neighbors = np.load(os.path.join(data_dir, NEIGHBORS_FILE), mmap_mode='r')
+        self.distances = np.load(os.path.join(data_dir, DISTANCES_FILE), mmap_mode='r')
+        if len(self.neighbors) != len(store):
+            raise ValueError("kNN graph does not match the keyframe store. Rebuild it with build_knn_graph.py.")
+
+    @staticmethod
+    def is_available(data_dir: str = config.COMPACT_DATA_DIR) -> bool:
+        return all(os.path.exists(os.path.join(data_dir, name)) for name in (NEIGHBORS_FILE, DISTANCES_FILE, GRAPH_META_FILE))
+
+    def similar(self, video_id: str, keyframe_index: int, top_k: int = config.KNN_NEIGHBORS) -> list:
+        """
+        Returns:
+            list: [((video_id, keyframe_index), distance), ...] closest first,
+                  or None if the keyframe is unknown.
+        """
+        row = self.store.row_of.get((video_id, keyframe_index))
+        if row is None:
+            return None
+        neighbor_rows = self.neighbors[row, :top_k]
+        neighbor_dists = self.distances[row, :top_k]
+        return [(self.store.key(r), float(d)) for r, d in zip(neighbor_rows, neighbor_dists) if r >= 0]
@@ -1,8 +1,7 @@
 from collections import defaultdict
 import config
 import logging
-from sentence_transformers import CrossEncoder
-from sentence_transformers import util
+import numpy as np
 
 logger = logging.getLogger(__name__)
 
@@ -15,12 +14,64 @@ def rrf_ranker(ranked_lists: list, k: int = config.RRF_K) -> dict:
 
     return fused_scores
 
+GROUP_AGGREGATIONS = ("max", "sum", "topn_mean")
+
+def group_by_video(frame_scores: dict, aggregation: str = config.GROUP_AGGREGATION,
+                   top_n: int = config.GROUPED_FRAMES_PER_VIDEO, limit: int = None) -> list:
+    """
+    Aggregates frame scores (higher is better) per video with a vectorized group-by.
+
+    Args:
+        frame_scores (dict): Mapping of (video_id, keyframe_index) -> score.
+        aggregation (str): "max", "sum" or "topn_mean" (mean of the best `top_n` frames).
+        top_n (int): Frames averaged by "topn_mean", and best frames returned per video.
+        limit (int): Number of videos to return. All if None.
+
+    Returns:
+        list: [(video_id, video_score, [((video_id, keyframe_index), frame_score), ...]), ...]
+              sorted by video_score, best first. Best frames are sorted best first.
+    """
+    if aggregation not in GROUP_AGGREGATIONS:
+        raise ValueError(f"Unknown aggregation: {aggregation}")
+    if not frame_scores:
+        return []
+
+    keys = list(frame_scores.keys())
+    scores = np.fromiter(frame_scores.values(), dtype=np.float64, count=len(keys))
+    video_ids, groups = np.unique([key[0] for key in keys], return_inverse=True)
+    num_videos = len(video_ids)
+
+    # Sort frames by video, then by score descending, and rank them within their video.
+    order = np.lexsort((-scores, groups))
+    sorted_groups = groups[order]
+    sorted_scores = scores[order]
+    group_starts = np.searchsorted(sorted_groups, np.arange(num_videos))
+    ranks = np.arange(len(order)) - group_starts[sorted_groups]
+    top = ranks < top_n
+
+    if aggregation == "max":
+        video_scores = sorted_scores[group_starts]
+    elif aggregation == "sum":
+        video_scores = np.bincount(groups, weights=scores, minlength=num_videos)
+    else:
+        video_scores = (np.bincount(sorted_groups[top], weights=sorted_scores[top], minlength=num_videos)
+                        / np.bincount(sorted_groups[top], minlength=num_videos))
+
+    ranked_videos = np.argsort(-video_scores, kind="stable")[:limit]
+    best_frames = [[] for _ in range(num_videos)]
+    for i in np.flatnonzero(top):
+        best_frames[sorted_groups[i]].append((keys[order[i]], float(sorted_scores[i])))
+
+    return [(str(video_ids[v]), float(video_scores[v]), best_frames[v]) for v in ranked_videos]
+
 class CrossModalReRanker:
     """
     A re-ranker that uses a cross-encoder model to re-score candidates
     based on the fine-grained similarity between an image and a text query.
     """
     def __init__(self, model_name: str = 'sentence-transformers/clip-ViT-B-32-multilingual-v1', device: str = 'cuda'):
+        from sentence_transformers import CrossEncoder
+
         logger.info(f"Loading Cross-Encoder model: {model_name} onto device: {device}")
         try:
             self.model = CrossEncoder(model_name, device=device)
@@ -44,6 +95,8 @@ class CrossModalReRanker:
         if not self.model or not candidate_frames:
             return {}
 
+        from sentence_transformers import util
+
         logger.info(f"Re-ranking {len(candidate_frames)} candidates with CLIP bi-encoder...")
 
         # Clean the text query
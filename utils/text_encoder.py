@@ -1,22 +1,154 @@
-import torch
-from multilingual_clip import pt_multilingual_clip
-import transformers
 import logging
+import os
 import config
 
 logger = logging.getLogger(__name__)
 
+QUANTIZED_MODEL_FILE = "model.pt" # state_dict of the quantized model
+TRANSFORMER_CONFIG_DIR = "transformer" # Config of the XLM-R backbone, to rebuild it without weights
+
+def configure_cpu_threads(num_threads: int = config.ENCODER_NUM_THREADS,
+                          interop_threads: int = config.ENCODER_INTEROP_THREADS):
+    """Applies the intra-op / inter-op thread settings for CPU inference."""
+    import torch
+
+    if num_threads > 0:
+        torch.set_num_threads(num_threads)
+    if interop_threads > 0:
+        try:
+            torch.set_num_interop_threads(interop_threads)
+        except RuntimeError as e:
+            # Can only be set once, before any inter-op parallel work has started.
+            logger.warning(f"Could not set inter-op threads: {e}")
+    logger.info(f"CPU threads: intra-op={torch.get_num_threads()}, inter-op={torch.get_num_interop_threads()}")
+
+def quantize(model):
+    """int8 dynamic quantization of the Linear layers."""
+    import torch
+
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+def _mclip_skeleton(mclip_config, transformer_config):
+    """
+    Same module layout as MultilingualCLIP, but with the backbone built from its config, so no fp32
+    weights are downloaded or loaded. Weights are left uninitialized: load_state_dict overwrites them.
+    """
+    import torch
+    import transformers
+    from transformers.modeling_utils import no_init_weights
+    from multilingual_clip import pt_multilingual_clip
+
+    class MultilingualCLIPSkeleton(pt_multilingual_clip.MultilingualCLIP):
+        def __init__(self, config):
+            transformers.PreTrainedModel.__init__(self, config)
+            self.transformer = transformers.AutoModel.from_config(transformer_config)
+            self.LinearTransformation = torch.nn.Linear(in_features=config.transformerDimensions,
+                                                        out_features=config.numDims)
+
+    with no_init_weights():
+        return MultilingualCLIPSkeleton(mclip_config)
+
+def _quantized_skeleton(mclip_config, transformer_config):
+    """
+    The module layout quantize() gives the skeleton, built directly instead of quantizing weights
+    that load_state_dict overwrites anyway. Each Linear becomes a 1x1 int8 dynamic Linear: its
+    weights are only packed once, when load_state_dict sets the real ones.
+    """
+    import torch
+
+    model = _mclip_skeleton(mclip_config, transformer_config)
+    for module in list(model.modules()):
+        for name, child in list(module.named_children()):
+            if type(child) is torch.nn.Linear: # Same match as quantize()
+                qlinear = torch.ao.nn.quantized.dynamic.Linear(1, 1, bias_=child.bias is not None, dtype=torch.qint8)
+                qlinear.in_features, qlinear.out_features = child.in_features, child.out_features
+                setattr(module, name, qlinear)
+    return model
+
+def load_quantized_model(cache_dir: str = config.QUANTIZED_MODEL_DIR):
+    """Loads the int8 model saved by build_quantized_model into an int8 skeleton."""
+    import torch
+    import transformers
+    from multilingual_clip import Config_MCLIP
+
+    mclip_config = Config_MCLIP.MCLIPConfig.from_pretrained(cache_dir)
+    transformer_config = transformers.AutoConfig.from_pretrained(os.path.join(cache_dir, TRANSFORMER_CONFIG_DIR))
+    model = _quantized_skeleton(mclip_config, transformer_config).eval()
+    # Memory-mapped and assigned, so the fp32 embeddings are paged in from the file instead of copied.
+    state_dict = torch.load(os.path.join(cache_dir, QUANTIZED_MODEL_FILE), weights_only=True, mmap=True)
+    model.load_state_dict(state_dict, assign=True)
+    tokenizer = transformers.AutoTokenizer.from_pretrained(cache_dir)
+    return model, tokenizer
+
+def min_cosine(model_a, model_b, tokenizer, queries: list) -> float:
+    """Smallest cosine similarity between the embeddings of the two models over `queries`."""
+    import torch
+
+    with torch.inference_mode():
+        embs_a = torch.nn.functional.normalize(model_a.forward(queries, tokenizer).float(), dim=1)
+        embs_b = torch.nn.functional.normalize(model_b.forward(queries, tokenizer).float(), dim=1)
+    return (embs_a * embs_b).sum(dim=1).min().item()
+
+def build_quantized_model(sample_queries: list, cache_dir: str = config.QUANTIZED_MODEL_DIR) -> float:
+    """
+    Quantizes the fp32 model to int8 and saves it (state_dict, configs and tokenizer) to `cache_dir`,
+    but only if its embeddings on `sample_queries` stay within config.ENCODER_MIN_COSINE of fp32.
+
+    Returns:
+        float: The smallest cosine similarity between int8 and fp32 embeddings.
+    """
+    import torch
+    import transformers
+    from multilingual_clip import pt_multilingual_clip
+
+    logger.info(f"Quantizing '{config.MODEL_NAME}' to int8...")
+    model = pt_multilingual_clip.MultilingualCLIP.from_pretrained(config.MODEL_NAME).eval()
+    tokenizer = transformers.AutoTokenizer.from_pretrained(config.MODEL_NAME)
+    quantized = quantize(model)
+
+    cosine = min_cosine(model, quantized, tokenizer, sample_queries)
+    if cosine < config.ENCODER_MIN_COSINE:
+        raise RuntimeError(f"int8 embedding drift exceeds tolerance: min cosine {cosine:.4f} < {config.ENCODER_MIN_COSINE}")
+
+    os.makedirs(cache_dir, exist_ok=True)
+    torch.save(quantized.state_dict(), os.path.join(cache_dir, QUANTIZED_MODEL_FILE))
+    model.config.save_pretrained(cache_dir)
+    model.transformer.config.save_pretrained(os.path.join(cache_dir, TRANSFORMER_CONFIG_DIR))
+    tokenizer.save_pretrained(cache_dir)
+    logger.info(f"Quantized model saved to '{cache_dir}' (min cosine vs fp32: {cosine:.4f}).")
+    return cosine
+
 class TextEncoder:
-    def __init__(self, device: str = 'cuda'):
+    def __init__(self, device: str = 'cuda', precision: str = config.ENCODER_PRECISION):
+        import transformers
+
         self.device = device
-        logger.info(f"Loading multilingual model '{config.MODEL_NAME}' to device '{self.device}'...")
-        self.model = pt_multilingual_clip.MultilingualCLIP.from_pretrained(config.MODEL_NAME)
-        self.tokenizer = transformers.AutoTokenizer.from_pretrained(config.MODEL_NAME)
-        self.model.to(self.device)
+        self.precision = precision if device == 'cpu' else 'fp32'
+
+        if self.device == 'cpu':
+            configure_cpu_threads()
+
+        if self.precision == 'int8' and not os.path.exists(os.path.join(config.QUANTIZED_MODEL_DIR, QUANTIZED_MODEL_FILE)):
+            logger.warning(f"No quantized model in '{config.QUANTIZED_MODEL_DIR}', falling back to fp32. "
+                           f"Build it with 'python quantize_encoder.py'.")
+            self.precision = 'fp32'
+
+        if self.precision == 'int8':
+            logger.info(f"Loading int8 model from '{config.QUANTIZED_MODEL_DIR}' to device 'cpu'...")
+            self.model, self.tokenizer = load_quantized_model()
+        else:
+            from multilingual_clip import pt_multilingual_clip
+
+            logger.info(f"Loading multilingual model '{config.MODEL_NAME}' to device '{self.device}'...")
+            self.model = pt_multilingual_clip.MultilingualCLIP.from_pretrained(config.MODEL_NAME)
+            self.tokenizer = transformers.AutoTokenizer.from_pretrained(config.MODEL_NAME)
+            self.model.to(self.device)
         self.model.eval() # Set model to evaluation mode
-        logger.info("TextEncoder initialized successfully.")
+        logger.info(f"TextEncoder initialized successfully ({self.precision}).")
 
     def encode(self, text_query: str):
-        with torch.no_grad():
+        import torch
+
+        with torch.inference_mode():
             text_features = self.model.forward([text_query], self.tokenizer)
-        return text_features.float().cpu().numpy()
\ No newline at end of file
+        return text_features.float().cpu().numpy()